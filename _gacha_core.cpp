@@ -0,0 +1,350 @@
+// 抽卡模拟热路径的C++实现（可选加速，test.py在导入失败时自动回退numba/纯Python路径）。
+// 与test.py中的六个_sim_*函数逐分支对应，概率表同样在启动时一次算好。
+//
+// 编译:
+//   c++ -O3 -march=native -fopenmp -shared -fPIC -std=c++17 \
+//       $(python -m pybind11 --includes) _gacha_core.cpp \
+//       -o _gacha_core$(python -c "import sysconfig; print(sysconfig.get_config_var('EXT_SUFFIX'))")
+
+#include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+#include <algorithm>
+#include <cstdint>
+#include <cstring>
+#include <random>
+#include <utility>
+
+namespace py = pybind11;
+
+namespace {
+
+// 状态/收集品数组布局，与test.py保持一致
+enum { PITY = 0, PITY4 = 1, IS_G = 2, IS_G4 = 3, MG = 4, FATE = 5, STATE_SIZE = 6 };
+enum { COLL_UP5 = 0, COLL_STD5 = 1, COLL_STD4 = 8, COLL_SIZE = COLL_STD4 + 39 };
+
+// ===== 每档pity的概率查找表 =====
+struct ProbTable {
+    double p5[90];
+    double p4[90];
+    ProbTable(int pity_max, double base, int ramp_start, double ramp, double p4_base) {
+        // 80保底的池也填满90行（硬保底后恒为p5=1.0），杜绝越界读到未初始化内存
+        for (int p = 0; p < 90; p++) {
+            double v = base + ramp * std::max(0, std::min(p + 1, pity_max) - ramp_start);
+            p5[p] = std::min(1.0, v);
+            p4[p] = p4_base / (p5[p] < 1.0 ? 1.0 - p5[p] : 0.99);
+        }
+    }
+};
+
+const ProbTable T_GENSHIN_CHAR(90, 0.006, 73, 0.06, 0.051);
+const ProbTable T_GENSHIN_WEAPON(80, 0.007, 63, 0.07, 0.051);
+const ProbTable T_HSR_CHAR(90, 0.006, 73, 0.06, 0.051);
+const ProbTable T_HSR_LC(80, 0.008, 65, 0.08, 0.066);
+const ProbTable T_ZZZ_CHAR(90, 0.006, 73, 0.06, 0.094);
+const ProbTable T_ZZZ_WEAPON(80, 0.01, 64, 0.061875, 0.15);
+
+// 四星重复获取的返还档位，按min(获取次数, 8)索引
+const int RET4_TIERS_GENSHIN[9] = {0, 0, 2, 2, 2, 2, 2, 2, 5};
+const int RET4_TIERS_HSR[9] = {0, 0, 8, 8, 8, 8, 8, 8, 20};
+
+struct Rng {
+    std::mt19937_64 gen;
+    std::uniform_real_distribution<double> dist{0.0, 1.0};
+    explicit Rng(uint64_t seed) : gen(seed) {}
+    double u() { return dist(gen); }
+};
+
+inline int ret_5_star_tracked(bool is_up, double u_sub, int* coll, int num_std,
+                              int first, int mid, int high) {
+    if (is_up) {
+        coll[COLL_UP5]++;
+        return coll[COLL_UP5] == 1 ? first : (coll[COLL_UP5] <= 7 ? mid : high);
+    }
+    int idx = COLL_STD5 + std::min((int)(u_sub * num_std), num_std - 1);
+    coll[idx]++;
+    int n = coll[idx];
+    if (n == 1) return 0;
+    return n <= 7 ? mid : high;
+}
+
+inline int ret_4_star_std_char(int* coll, int char_idx, const int* tiers) {
+    int idx = COLL_STD4 + char_idx;
+    coll[idx] = std::min(coll[idx] + 1, 8);
+    return tiers[coll[idx]];
+}
+
+std::pair<int, int> sim_genshin_char(int* state, int* coll, bool up4_c6, Rng& rng) {
+    int pulls = 0, returns = 0;
+    while (true) {
+        pulls++; state[PITY]++; state[PITY4]++;
+        // 初始pity可能超过硬保底（JS侧不做范围校验），截到表尾行(p5=1.0)
+        int p = std::min(state[PITY] - 1, 89);
+        double p5 = T_GENSHIN_CHAR.p5[p];
+        // 单个均匀数复合五星/胜负/四星三个判定（逆CDF复合，见test.py）
+        double u = rng.u();
+        if (__builtin_expect(u < p5, 0)) {
+            bool was_g = state[IS_G] == 1;
+            // 明光+50/50；大保底或明光计满必中
+            double p_win = (was_g || state[MG] >= 3) ? 1.0 : 0.00018 + (1.0 - 0.00018) * 0.5;
+            bool is_target = u < p5 * p_win;
+            state[PITY] = 0; state[PITY4] = 0;
+            double u_sub = is_target ? 0.0 : (u - p5 * p_win) / (p5 - p5 * p_win);
+            returns += ret_5_star_tracked(is_target, u_sub, coll, 7, 10, 10, 25);
+            if (is_target) {
+                state[IS_G] = 0;
+                if (!was_g) state[MG] = 0;
+                return {pulls, returns};
+            }
+            state[IS_G] = 1;
+            if (!was_g) state[MG] = std::min(state[MG] + 1, 3);
+        } else if (state[PITY4] >= 10 || (u - p5) / (1.0 - p5) < T_GENSHIN_CHAR.p4[p]) {
+            state[PITY4] = 0;
+            if (state[IS_G4] == 1 || rng.u() < 0.5) {
+                state[IS_G4] = 0;
+                returns += up4_c6 ? 5 : 2;
+            } else {
+                state[IS_G4] = 1;
+                double u = rng.u();
+                if (u < 39.0 / 57.0)
+                    returns += ret_4_star_std_char(coll, (int)(u * 57.0), RET4_TIERS_GENSHIN);
+                else
+                    returns += 2;
+            }
+        }
+    }
+}
+
+std::pair<int, int> sim_genshin_weapon(int* state, int* coll, bool, Rng& rng) {
+    int pulls = 0, returns = 0;
+    while (true) {
+        pulls++; state[PITY]++; state[PITY4]++;
+        int p = std::min(state[PITY] - 1, 79);
+        double p5 = T_GENSHIN_WEAPON.p5[p];
+        // 单个均匀数复合五星/胜负/四星三个判定（逆CDF复合，见test.py）
+        double u = rng.u();
+        if (__builtin_expect(u < p5, 0)) {
+            bool was_g = state[IS_G] == 1 || state[FATE] >= 2;
+            double p_win = was_g ? 1.0 : 0.375;
+            bool is_target = u < p5 * p_win;
+            state[PITY] = 0; state[PITY4] = 0;
+            returns += 10;  // 武器池5星只返还10星辉
+            if (is_target) {
+                state[IS_G] = 0; state[FATE] = 0;
+                return {pulls, returns};
+            }
+            state[IS_G] = 1;
+            state[FATE] = std::min(state[FATE] + 1, 2);
+        } else if (state[PITY4] >= 10 || (u - p5) / (1.0 - p5) < T_GENSHIN_WEAPON.p4[p]) {
+            state[PITY4] = 0;
+            if (state[IS_G4] == 1 || rng.u() < 0.75) {
+                state[IS_G4] = 0;
+                returns += 2;
+            } else {
+                state[IS_G4] = 1;
+                double u = rng.u();
+                if (u < 39.0 / 57.0)
+                    returns += ret_4_star_std_char(coll, (int)(u * 57.0), RET4_TIERS_GENSHIN);
+                else
+                    returns += 2;
+            }
+        }
+    }
+}
+
+std::pair<int, int> sim_hsr_char(int* state, int* coll, bool up4_c6, Rng& rng) {
+    int pulls = 0, returns = 0;
+    while (true) {
+        pulls++; state[PITY]++; state[PITY4]++;
+        int p = std::min(state[PITY] - 1, 89);
+        double p5 = T_HSR_CHAR.p5[p];
+        // 单个均匀数复合五星/胜负/四星三个判定（逆CDF复合，见test.py）
+        double u = rng.u();
+        if (__builtin_expect(u < p5, 0)) {
+            bool was_g = state[IS_G] == 1;
+            double p_win = was_g ? 1.0 : 0.5625;  // 星铁无明光机制
+            bool is_target = u < p5 * p_win;
+            state[PITY] = 0; state[PITY4] = 0;
+            double u_sub = is_target ? 0.0 : (u - p5 * p_win) / (p5 - p5 * p_win);
+            returns += ret_5_star_tracked(is_target, u_sub, coll, 7, 40, 40, 100);
+            if (is_target) {
+                state[IS_G] = 0;
+                return {pulls, returns};
+            }
+            state[IS_G] = 1;
+        } else if (state[PITY4] >= 10 || (u - p5) / (1.0 - p5) < T_HSR_CHAR.p4[p]) {
+            state[PITY4] = 0;
+            if (state[IS_G4] == 1 || rng.u() < 0.5) {
+                state[IS_G4] = 0;
+                returns += up4_c6 ? 20 : 8;
+            } else {
+                state[IS_G4] = 1;
+                double u = rng.u();
+                if (u < 22.0 / 51.0)
+                    returns += ret_4_star_std_char(coll, (int)(u * 51.0), RET4_TIERS_HSR);
+                else
+                    returns += 8;
+            }
+        }
+    }
+}
+
+std::pair<int, int> sim_hsr_lightcone(int* state, int* coll, bool, Rng& rng) {
+    int pulls = 0, returns = 0;
+    while (true) {
+        pulls++; state[PITY]++; state[PITY4]++;
+        int p = std::min(state[PITY] - 1, 79);
+        double p5 = T_HSR_LC.p5[p];
+        // 单个均匀数复合五星/胜负/四星三个判定（逆CDF复合，见test.py）
+        double u = rng.u();
+        if (__builtin_expect(u < p5, 0)) {
+            bool was_g = state[IS_G] == 1;
+            double p_win = was_g ? 1.0 : 0.75;
+            bool is_target = u < p5 * p_win;
+            state[PITY] = 0; state[PITY4] = 0;
+            returns += 40;  // 光锥池5星只返还40星芒
+            if (is_target) {
+                state[IS_G] = 0;
+                return {pulls, returns};
+            }
+            state[IS_G] = 1;
+        } else if (state[PITY4] >= 10 || (u - p5) / (1.0 - p5) < T_HSR_LC.p4[p]) {
+            state[PITY4] = 0;
+            if (state[IS_G4] == 1 || rng.u() < 0.75) {
+                state[IS_G4] = 0;
+                returns += 8;
+            } else {
+                state[IS_G4] = 1;
+                double u = rng.u();
+                if (u < 22.0 / 51.0)
+                    returns += ret_4_star_std_char(coll, (int)(u * 51.0), RET4_TIERS_HSR);
+                else
+                    returns += 8;
+            }
+        }
+    }
+}
+
+std::pair<int, int> sim_zzz_char(int* state, int* coll, bool up4_c6, Rng& rng) {
+    int pulls = 0, returns = 0;
+    while (true) {
+        pulls++; state[PITY]++; state[PITY4]++;
+        int p = std::min(state[PITY] - 1, 89);
+        double p5 = T_ZZZ_CHAR.p5[p];
+        // 单个均匀数复合五星/胜负/四星三个判定（逆CDF复合，见test.py）
+        double u = rng.u();
+        if (__builtin_expect(u < p5, 0)) {
+            bool was_g = state[IS_G] == 1;
+            double p_win = was_g ? 1.0 : 0.5;
+            bool is_target = u < p5 * p_win;
+            state[PITY] = 0; state[PITY4] = 0;
+            double u_sub = is_target ? 0.0 : (u - p5 * p_win) / (p5 - p5 * p_win);
+            // ZZZ的UP首个也返还0（与原神/星铁不同）
+            returns += ret_5_star_tracked(is_target, u_sub, coll, 6, 0, 40, 100);
+            if (is_target) {
+                state[IS_G] = 0;
+                return {pulls, returns};
+            }
+            state[IS_G] = 1;
+        } else if (state[PITY4] >= 10 || (u - p5) / (1.0 - p5) < T_ZZZ_CHAR.p4[p]) {
+            state[PITY4] = 0;
+            if (state[IS_G4] == 1 || rng.u() < 0.5) {
+                state[IS_G4] = 0;
+                returns += up4_c6 ? 20 : 8;
+            } else {
+                state[IS_G4] = 1;
+                double u = rng.u();
+                if (u < 7.05 / (7.05 + 2.35))
+                    returns += ret_4_star_std_char(coll, (int)(u * 16.0), RET4_TIERS_HSR);
+                else
+                    returns += 8;
+            }
+        }
+    }
+}
+
+std::pair<int, int> sim_zzz_weapon(int* state, int* coll, bool, Rng& rng) {
+    int pulls = 0, returns = 0;
+    while (true) {
+        pulls++; state[PITY]++; state[PITY4]++;
+        int p = std::min(state[PITY] - 1, 79);
+        double p5 = T_ZZZ_WEAPON.p5[p];
+        // 单个均匀数复合五星/胜负/四星三个判定（逆CDF复合，见test.py）
+        double u = rng.u();
+        if (__builtin_expect(u < p5, 0)) {
+            bool was_g = state[IS_G] == 1;
+            double p_win = was_g ? 1.0 : 0.75;
+            bool is_target = u < p5 * p_win;
+            state[PITY] = 0; state[PITY4] = 0;
+            returns += 40;
+            if (is_target) {
+                state[IS_G] = 0;
+                return {pulls, returns};
+            }
+            state[IS_G] = 1;
+        } else if (state[PITY4] >= 10 || (u - p5) / (1.0 - p5) < T_ZZZ_WEAPON.p4[p]) {
+            state[PITY4] = 0;
+            if (state[IS_G4] == 1 || rng.u() < 0.75) {
+                state[IS_G4] = 0;
+                returns += 8;
+            } else {
+                state[IS_G4] = 1;
+                double u = rng.u();
+                if (u < 13.125 / (13.125 + 1.875))
+                    returns += 8;
+                else
+                    returns += ret_4_star_std_char(coll, (int)((u - 0.875) * 96.0), RET4_TIERS_HSR);
+            }
+        }
+    }
+}
+
+using SimFn = std::pair<int, int> (*)(int*, int*, bool, Rng&);
+const SimFn SIM_FNS[6] = {sim_genshin_char, sim_genshin_weapon, sim_hsr_char,
+                          sim_hsr_lightcone, sim_zzz_char, sim_zzz_weapon};
+
+py::tuple run_batch(int pool_id, int n_sims, int target_count,
+                    py::array_t<int32_t, py::array::c_style | py::array::forcecast> init_state,
+                    bool up4_c6, uint64_t base_seed) {
+    if (pool_id < 0 || pool_id > 5)
+        throw py::value_error("unknown pool_id: " + std::to_string(pool_id));
+    SimFn sim = SIM_FNS[pool_id];
+
+    int init[STATE_SIZE] = {0};
+    auto buf = init_state.unchecked<1>();
+    for (int j = 0; j < STATE_SIZE && j < (int)buf.shape(0); j++) init[j] = buf(j);
+
+    auto out_pulls = py::array_t<int32_t>(n_sims);
+    auto out_returns = py::array_t<int32_t>(n_sims);
+    int32_t* op = out_pulls.mutable_data();
+    int32_t* orr = out_returns.mutable_data();
+
+    {
+        py::gil_scoped_release release;
+        // 各模拟完全独立，按模拟编号种子化，结果与线程调度无关
+        #pragma omp parallel for schedule(static)
+        for (int i = 0; i < n_sims; i++) {
+            Rng rng(base_seed + (uint64_t)i);
+            int state[STATE_SIZE];
+            std::memcpy(state, init, sizeof(state));
+            int coll[COLL_SIZE] = {0};
+            int total_pulls = 0, total_returns = 0;
+            for (int t = 0; t < target_count; t++) {
+                auto [pulls, returns] = sim(state, coll, up4_c6, rng);
+                total_pulls += pulls;
+                total_returns += returns;
+            }
+            op[i] = total_pulls;
+            orr[i] = total_returns;
+        }
+    }
+    return py::make_tuple(out_pulls, out_returns);
+}
+
+}  // namespace
+
+PYBIND11_MODULE(_gacha_core, m) {
+    m.doc() = "抽卡模拟的C++热路径(OpenMP并行)";
+    m.def("run_batch", &run_batch, py::arg("pool_id"), py::arg("n_sims"),
+          py::arg("target_count"), py::arg("init_state"), py::arg("up4_c6"),
+          py::arg("base_seed"));
+}
@@ -1,80 +1,544 @@
+import os
 import sys
 import json
 import numpy as np # type: ignore
 
+try:
+    from numba import njit, prange # type: ignore
+    NUMBA_AVAILABLE = True
+except ImportError:
+    # numba是可选的加速依赖，缺失时回退到纯Python模拟路径
+    NUMBA_AVAILABLE = False
+    prange = range
+    def njit(*args, **kwargs):
+        def wrap(func): return func
+        return wrap(args[0]) if args and callable(args[0]) else wrap
+
+try:
+    # C++热路径(OpenMP)，编译方式见_gacha_core.cpp顶部注释；未编译时走numba/纯Python
+    import _gacha_core # type: ignore
+    CORE_AVAILABLE = True
+except ImportError:
+    CORE_AVAILABLE = False
+
+# ===== 期望/吸收概率表的O(n)回代求解 =====
+# 保底链的转移图在pity维度上是无环的，唯一的"回边"是歪了之后重置到
+# (pity=0, guaranteed=True)——而guaranteed状态必不歪(p_lose=0)，
+# 所以先对guaranteed列做纯回代，再回代非保底列，整个系统O(n)可解，
+# 无需构建转移矩阵做O(n^3)的通用求解。
+
+@njit(cache=True)
+def _backsolve_simple_chain(p5, p_lose):
+    """(pity, is_g)两维链的期望回代，布局与_state_to_index一致: p + is_g*PITY_MAX"""
+    n = p5.shape[0]
+    E = np.empty(2 * n)
+    # guaranteed列: 出金必为目标，只依赖更高pity
+    nxt = 0.0
+    for p in range(n - 1, -1, -1):
+        nxt = 1.0 + (1.0 - p5[p]) * nxt
+        E[p + n] = nxt
+    # 非保底列: 歪了重置到(0, guaranteed)，该期望已求出
+    e_reset = E[n]
+    nxt = 0.0
+    for p in range(n - 1, -1, -1):
+        nxt = 1.0 + (1.0 - p5[p]) * nxt + p5[p] * p_lose * e_reset
+        E[p] = nxt
+    return E
+
+@njit(cache=True)
+def _backsolve_fate_chain(p5, p_lose, fate_max):
+    """原神武器池(pity, fate, is_g)链的期望回代，布局: p + fate*n + is_g*n*fate_max"""
+    n = p5.shape[0]
+    E = np.empty(2 * fate_max * n)
+    for fate in range(fate_max):
+        nxt = 0.0
+        for p in range(n - 1, -1, -1):
+            nxt = 1.0 + (1.0 - p5[p]) * nxt
+            E[p + fate * n + n * fate_max] = nxt
+    for fate in range(fate_max):
+        # 命定值满时必中，不存在歪的回边
+        lose = 0.0 if fate >= fate_max - 1 else p_lose
+        e_reset = E[min(fate + 1, fate_max - 1) * n + n * fate_max]
+        nxt = 0.0
+        for p in range(n - 1, -1, -1):
+            nxt = 1.0 + (1.0 - p5[p]) * nxt + p5[p] * lose * e_reset
+            E[p + fate * n] = nxt
+    return E
+
+@njit(cache=True)
+def _backsolve_mg_chain(p5, p_lose_by_mg):
+    """原神/星铁角色池(pity, is_g, mg)链的期望回代，布局: p + is_g*n + mg*2*n。
+    每档明光计数的歪概率由p_lose_by_mg给出（星铁恒定，原神mg=3时为0）"""
+    n = p5.shape[0]
+    mg_max = p_lose_by_mg.shape[0]
+    E = np.empty(2 * mg_max * n)
+    for mg in range(mg_max):
+        nxt = 0.0
+        for p in range(n - 1, -1, -1):
+            nxt = 1.0 + (1.0 - p5[p]) * nxt
+            E[p + n + mg * 2 * n] = nxt
+    for mg in range(mg_max):
+        lose = p_lose_by_mg[mg]
+        # 歪了进入(0, guaranteed, mg+1)
+        e_reset = E[n + min(mg + 1, mg_max - 1) * 2 * n]
+        nxt = 0.0
+        for p in range(n - 1, -1, -1):
+            nxt = 1.0 + (1.0 - p5[p]) * nxt + p5[p] * lose * e_reset
+            E[p + mg * 2 * n] = nxt
+    return E
+
+@njit(cache=True)
+def _backsolve_mg_absorption(p5, p_lose_by_mg):
+    """角色池吸收概率的回代: B[state, final_mg]为从state出发拿到目标时
+    落在final_mg档的概率。结构与期望回代相同，右端项换成吸收向量"""
+    n = p5.shape[0]
+    mg_max = p_lose_by_mg.shape[0]
+    B = np.zeros((2 * mg_max * n, mg_max))
+    for mg in range(mg_max):
+        nxt = np.zeros(mg_max)
+        for p in range(n - 1, -1, -1):
+            row = (1.0 - p5[p]) * nxt
+            row[mg] += p5[p]  # 大保底胜出，吸收于当前mg
+            B[p + n + mg * 2 * n, :] = row
+            nxt = row
+    for mg in range(mg_max):
+        lose = p_lose_by_mg[mg]
+        reset = B[n + min(mg + 1, mg_max - 1) * 2 * n].copy()
+        nxt = np.zeros(mg_max)
+        for p in range(n - 1, -1, -1):
+            row = (1.0 - p5[p]) * nxt + p5[p] * lose * reset
+            row[0] += p5[p] * (1.0 - lose)  # 小保底胜出，mg归零
+            B[p + mg * 2 * n, :] = row
+            nxt = row
+    return B
+
+# ===== 每档pity的概率查找表 =====
+# p5与条件四星概率只依赖pity档位，模块加载时一次算好，
+# 抽卡循环内用一次读表替代分支+乘加。numba把全局数组冻结为编译期常量。
+
+def _prob_tables(pity_max, base, ramp_start, ramp, p4_base):
+    """返回(P5, P4_COND): P5[p]为第p+1抽的出金概率，
+    P4_COND[p]为该抽未出金时出四星的条件概率(p4 / (1 - p5))"""
+    pulls = np.arange(1, pity_max + 1)
+    p5 = np.minimum(1.0, base + ramp * np.maximum(0, pulls - ramp_start))
+    # p5==1时条件概率不会被用到（必出金），分母按原实现取0.99占位
+    return p5, p4_base / np.where(p5 < 1.0, 1.0 - p5, 0.99)
+
+P5_GENSHIN_CHAR, P4_GENSHIN_CHAR = _prob_tables(90, 0.006, 73, 0.06, 0.051)
+P5_GENSHIN_WEAPON, P4_GENSHIN_WEAPON = _prob_tables(80, 0.007, 63, 0.07, 0.051)
+P5_HSR_CHAR, P4_HSR_CHAR = _prob_tables(90, 0.006, 73, 0.06, 0.051)
+P5_HSR_LC, P4_HSR_LC = _prob_tables(80, 0.008, 65, 0.08, 0.066)
+P5_ZZZ_CHAR, P4_ZZZ_CHAR = _prob_tables(90, 0.006, 73, 0.06, 0.094)
+P5_ZZZ_WEAPON, P4_ZZZ_WEAPON = _prob_tables(80, 0.01, 64, 0.061875, 0.15)
+
+# ===== JIT模拟热路径 =====
+# 状态数组布局（替代模拟热路径中的dict，便于numba编译）
+PITY, PITY4, IS_G, IS_G4, MG, FATE = 0, 1, 2, 3, 4, 5
+STATE_SIZE = 6
+# collection数组布局: 0=UP五星, 1..7=常驻五星, 8起=常驻四星角色
+COLL_UP5, COLL_STD5, COLL_STD4 = 0, 1, 8
+COLL_SIZE = COLL_STD4 + 39  # 按最大常驻四星角色数（原神39）预留
+# 每个模拟按块批量取均匀数: 向量填充一次256个比逐次标量调用RNG快得多
+RAND_BUF = 256
+
+def _state_array_from_dict(init):
+    """把JS侧传来的initialState dict转成定长int32数组"""
+    state = np.zeros(STATE_SIZE, dtype=np.int32)
+    state[PITY] = init.get('pity', 0)
+    state[IS_G] = 1 if init.get('isGuaranteed') else 0
+    state[MG] = init.get('mingguangCounter', 0)
+    state[FATE] = init.get('fatePoint', 0)
+    return state
+
+# 常驻五星的均匀CDF，np.searchsorted在jit内完成离散采样
+CDF_STD5_7 = np.arange(1, 8) / 7.0   # 原神/星铁常驻7名
+CDF_STD5_6 = np.arange(1, 7) / 6.0   # 绝区零常驻6名
+
+# 五星重复获取的返还档位，按min(获取次数, 8)索引；UP与常驻首个返还不同，
+# ZZZ的UP首个也返还0（与原神/星铁不同）所以与常驻共用一张表
+RET5_UP_GENSHIN = np.array([0, 10, 10, 10, 10, 10, 10, 10, 25])
+RET5_STD_GENSHIN = np.array([0, 0, 10, 10, 10, 10, 10, 10, 25])
+RET5_UP_HSR = np.array([0, 40, 40, 40, 40, 40, 40, 40, 100])
+RET5_STD_HSR = np.array([0, 0, 40, 40, 40, 40, 40, 40, 100])
+RET5_ZZZ = np.array([0, 0, 40, 40, 40, 40, 40, 40, 100])
+
+@njit(cache=True)
+def _ret_5_star_tracked(is_up, u_sub, coll, cdf_std, up_tiers, std_tiers):
+    """通用五星返还计算: UP与常驻分别计数，按获取次数查表。
+    u_sub是歪时复用胜负判定重标定出的均匀数，省一次RNG调用"""
+    if is_up:
+        coll[COLL_UP5] = min(coll[COLL_UP5] + 1, 8)
+        return up_tiers[coll[COLL_UP5]]
+    idx = COLL_STD5 + np.searchsorted(cdf_std, u_sub)
+    coll[idx] = min(coll[idx] + 1, 8)
+    return std_tiers[coll[idx]]
+
+# 四星重复获取的返还档位，按min(获取次数, 8)索引: 首个0，2-7次mid，之后high
+RET4_TIERS_GENSHIN = np.array([0, 0, 2, 2, 2, 2, 2, 2, 5])
+RET4_TIERS_HSR = np.array([0, 0, 8, 8, 8, 8, 8, 8, 20])
+
+@njit(cache=True)
+def _ret_4_star_std_char(coll, char_idx, tiers):
+    """歪出常驻四星角色时按获取次数查表计算返还"""
+    idx = COLL_STD4 + char_idx
+    coll[idx] = min(coll[idx] + 1, 8)
+    return tiers[coll[idx]]
+
+@njit(cache=True)
+def _sim_genshin_char(state, coll, up4_c6):
+    pulls, returns = 0, 0
+    rands = np.random.random(RAND_BUF)
+    ri = 0
+    while True:
+        # 每抽最多消耗3个均匀数，余量不足时整块重填
+        if ri > RAND_BUF - 3:
+            rands = np.random.random(RAND_BUF)
+            ri = 0
+        pulls += 1; state[PITY] += 1; state[PITY4] += 1
+        # 初始pity可能超过硬保底（JS侧不做范围校验），截到表尾行(p5=1.0)
+        p = min(state[PITY] - 1, 89)
+        p5 = P5_GENSHIN_CHAR[p]
+        # 单个均匀数按逆CDF复合三个判定: u<p5*p_win中UP，p5*p_win<=u<p5歪，
+        # u>=p5时(u-p5)/(1-p5)重标定后做四星判定
+        u = rands[ri]; ri += 1
+        if u < p5:
+            was_g = state[IS_G] == 1
+            if was_g or state[MG] >= 3:
+                p_win = 1.0
+            else:
+                p_win = 0.00018 + (1.0 - 0.00018) * 0.5  # 明光+50/50
+            is_target = u < p5 * p_win
+            state[PITY], state[PITY4] = 0, 0
+            # 歪时把u重标定回[0,1)均匀数，复用给常驻五星的采样
+            u_sub = 0.0 if is_target else (u - p5 * p_win) / (p5 - p5 * p_win)
+            returns += _ret_5_star_tracked(is_target, u_sub, coll, CDF_STD5_7, RET5_UP_GENSHIN, RET5_STD_GENSHIN)
+            if is_target:
+                state[IS_G] = 0
+                if not was_g: state[MG] = 0
+                return pulls, returns
+            else:
+                state[IS_G] = 1
+                if not was_g: state[MG] = min(state[MG] + 1, 3)
+        elif state[PITY4] >= 10 or (u - p5) / (1.0 - p5) < P4_GENSHIN_CHAR[p]:
+            state[PITY4] = 0
+            u4 = rands[ri]; ri += 1
+            if state[IS_G4] == 1 or u4 < 0.5:
+                state[IS_G4] = 0
+                returns += 5 if up4_c6 else 2
+            else:
+                state[IS_G4] = 1
+                # 复用同一个均匀数: u<39/57时u*57在[0,39)内均匀
+                u = rands[ri]; ri += 1
+                if u < 39.0 / 57.0:
+                    returns += _ret_4_star_std_char(coll, int(u * 57.0), RET4_TIERS_GENSHIN)
+                else:
+                    returns += 2
+
+@njit(cache=True)
+def _sim_genshin_weapon(state, coll, up4_c6):
+    pulls, returns = 0, 0
+    rands = np.random.random(RAND_BUF)
+    ri = 0
+    while True:
+        # 每抽最多消耗3个均匀数，余量不足时整块重填
+        if ri > RAND_BUF - 3:
+            rands = np.random.random(RAND_BUF)
+            ri = 0
+        pulls += 1; state[PITY] += 1; state[PITY4] += 1
+        p = min(state[PITY] - 1, 79)
+        p5 = P5_GENSHIN_WEAPON[p]
+        u = rands[ri]; ri += 1
+        if u < p5:
+            was_g = state[IS_G] == 1 or state[FATE] >= 2
+            p_win = 1.0 if was_g else 0.375
+            is_target = u < p5 * p_win
+            state[PITY], state[PITY4] = 0, 0
+            returns += 10  # 武器池5星只返还10星辉
+            if is_target:
+                state[IS_G], state[FATE] = 0, 0
+                return pulls, returns
+            else:
+                state[IS_G] = 1
+                state[FATE] = min(state[FATE] + 1, 2)
+        elif state[PITY4] >= 10 or (u - p5) / (1.0 - p5) < P4_GENSHIN_WEAPON[p]:
+            state[PITY4] = 0
+            u4 = rands[ri]; ri += 1
+            if state[IS_G4] == 1 or u4 < 0.75:
+                state[IS_G4] = 0
+                returns += 2
+            else:
+                state[IS_G4] = 1
+                # 复用同一个均匀数: u<39/57时u*57在[0,39)内均匀
+                u = rands[ri]; ri += 1
+                if u < 39.0 / 57.0:
+                    returns += _ret_4_star_std_char(coll, int(u * 57.0), RET4_TIERS_GENSHIN)
+                else:
+                    returns += 2
+
+@njit(cache=True)
+def _sim_hsr_char(state, coll, up4_c6):
+    pulls, returns = 0, 0
+    rands = np.random.random(RAND_BUF)
+    ri = 0
+    while True:
+        # 每抽最多消耗3个均匀数，余量不足时整块重填
+        if ri > RAND_BUF - 3:
+            rands = np.random.random(RAND_BUF)
+            ri = 0
+        pulls += 1; state[PITY] += 1; state[PITY4] += 1
+        p = min(state[PITY] - 1, 89)
+        p5 = P5_HSR_CHAR[p]
+        u = rands[ri]; ri += 1
+        if u < p5:
+            was_g = state[IS_G] == 1
+            p_win = 1.0 if was_g else 0.5625  # 星铁无明光机制
+            is_target = u < p5 * p_win
+            state[PITY], state[PITY4] = 0, 0
+            u_sub = 0.0 if is_target else (u - p5 * p_win) / (p5 - p5 * p_win)
+            returns += _ret_5_star_tracked(is_target, u_sub, coll, CDF_STD5_7, RET5_UP_HSR, RET5_STD_HSR)
+            if is_target:
+                state[IS_G] = 0
+                return pulls, returns
+            else:
+                state[IS_G] = 1
+        elif state[PITY4] >= 10 or (u - p5) / (1.0 - p5) < P4_HSR_CHAR[p]:
+            state[PITY4] = 0
+            u4 = rands[ri]; ri += 1
+            if state[IS_G4] == 1 or u4 < 0.5:
+                state[IS_G4] = 0
+                returns += 20 if up4_c6 else 8
+            else:
+                state[IS_G4] = 1
+                u = rands[ri]; ri += 1
+                if u < 22.0 / 51.0:
+                    returns += _ret_4_star_std_char(coll, int(u * 51.0), RET4_TIERS_HSR)
+                else:
+                    returns += 8
+
+@njit(cache=True)
+def _sim_hsr_lightcone(state, coll, up4_c6):
+    pulls, returns = 0, 0
+    rands = np.random.random(RAND_BUF)
+    ri = 0
+    while True:
+        # 每抽最多消耗3个均匀数，余量不足时整块重填
+        if ri > RAND_BUF - 3:
+            rands = np.random.random(RAND_BUF)
+            ri = 0
+        pulls += 1; state[PITY] += 1; state[PITY4] += 1
+        p = min(state[PITY] - 1, 79)
+        p5 = P5_HSR_LC[p]
+        u = rands[ri]; ri += 1
+        if u < p5:
+            was_g = state[IS_G] == 1
+            p_win = 1.0 if was_g else 0.75
+            is_target = u < p5 * p_win
+            state[PITY], state[PITY4] = 0, 0
+            returns += 40  # 光锥池5星只返还40星芒
+            if is_target:
+                state[IS_G] = 0
+                return pulls, returns
+            else:
+                state[IS_G] = 1
+        elif state[PITY4] >= 10 or (u - p5) / (1.0 - p5) < P4_HSR_LC[p]:
+            state[PITY4] = 0
+            u4 = rands[ri]; ri += 1
+            if state[IS_G4] == 1 or u4 < 0.75:
+                state[IS_G4] = 0
+                returns += 8
+            else:
+                state[IS_G4] = 1
+                u = rands[ri]; ri += 1
+                if u < 22.0 / 51.0:
+                    returns += _ret_4_star_std_char(coll, int(u * 51.0), RET4_TIERS_HSR)
+                else:
+                    returns += 8
+
+@njit(cache=True)
+def _sim_zzz_char(state, coll, up4_c6):
+    pulls, returns = 0, 0
+    rands = np.random.random(RAND_BUF)
+    ri = 0
+    while True:
+        # 每抽最多消耗3个均匀数，余量不足时整块重填
+        if ri > RAND_BUF - 3:
+            rands = np.random.random(RAND_BUF)
+            ri = 0
+        pulls += 1; state[PITY] += 1; state[PITY4] += 1
+        p = min(state[PITY] - 1, 89)
+        p5 = P5_ZZZ_CHAR[p]
+        u = rands[ri]; ri += 1
+        if u < p5:
+            was_g = state[IS_G] == 1
+            p_win = 1.0 if was_g else 0.5
+            is_target = u < p5 * p_win
+            state[PITY], state[PITY4] = 0, 0
+            u_sub = 0.0 if is_target else (u - p5 * p_win) / (p5 - p5 * p_win)
+            returns += _ret_5_star_tracked(is_target, u_sub, coll, CDF_STD5_6, RET5_ZZZ, RET5_ZZZ)
+            if is_target:
+                state[IS_G] = 0
+                return pulls, returns
+            else:
+                state[IS_G] = 1
+        elif state[PITY4] >= 10 or (u - p5) / (1.0 - p5) < P4_ZZZ_CHAR[p]:
+            state[PITY4] = 0
+            u4 = rands[ri]; ri += 1
+            if state[IS_G4] == 1 or u4 < 0.5:
+                state[IS_G4] = 0
+                returns += 20 if up4_c6 else 8
+            else:
+                state[IS_G4] = 1
+                u = rands[ri]; ri += 1
+                if u < 7.05 / (7.05 + 2.35):
+                    returns += _ret_4_star_std_char(coll, int(u * 16.0), RET4_TIERS_HSR)
+                else:
+                    returns += 8
+
+@njit(cache=True)
+def _sim_zzz_weapon(state, coll, up4_c6):
+    pulls, returns = 0, 0
+    rands = np.random.random(RAND_BUF)
+    ri = 0
+    while True:
+        # 每抽最多消耗3个均匀数，余量不足时整块重填
+        if ri > RAND_BUF - 3:
+            rands = np.random.random(RAND_BUF)
+            ri = 0
+        pulls += 1; state[PITY] += 1; state[PITY4] += 1
+        p = min(state[PITY] - 1, 79)
+        p5 = P5_ZZZ_WEAPON[p]
+        u = rands[ri]; ri += 1
+        if u < p5:
+            was_g = state[IS_G] == 1
+            p_win = 1.0 if was_g else 0.75
+            is_target = u < p5 * p_win
+            state[PITY], state[PITY4] = 0, 0
+            returns += 40
+            if is_target:
+                state[IS_G] = 0
+                return pulls, returns
+            else:
+                state[IS_G] = 1
+        elif state[PITY4] >= 10 or (u - p5) / (1.0 - p5) < P4_ZZZ_WEAPON[p]:
+            state[PITY4] = 0
+            u4 = rands[ri]; ri += 1
+            if state[IS_G4] == 1 or u4 < 0.75:
+                state[IS_G4] = 0
+                returns += 8
+            else:
+                state[IS_G4] = 1
+                u = rands[ri]; ri += 1
+                if u < 13.125 / (13.125 + 1.875):
+                    returns += 8
+                else:
+                    returns += _ret_4_star_std_char(coll, int((u - 0.875) * 96.0), RET4_TIERS_HSR)
+
+# 模型key到jit分发id的映射，与MODEL_LOGIC的key保持一致
+MODEL_IDS = {
+    "genshin-character": 0,
+    "genshin-weapon": 1,
+    "hsr-character": 2,
+    "hsr-lightcone": 3,
+    "zzz-character": 4,
+    "zzz-weapon": 5,
+}
+
+_SIM_FNS = (_sim_genshin_char, _sim_genshin_weapon, _sim_hsr_char,
+            _sim_hsr_lightcone, _sim_zzz_char, _sim_zzz_weapon)
+
+# 按(model_id, up4_c6)特化好的批量模拟函数。numba把闭包自由变量冻结为
+# 编译期常量，按模型的分发在编译期就解析成对具体_sim_*的直接调用，
+# 不再每次模拟走一遍if/elif级联。编译开销在单次调用的几万次模拟上摊销
+# （闭包无法配合cache=True落盘，内层_sim_*仍走磁盘缓存）
+_SPECIALIZED_BATCHES = {}
+
+def _get_run_batch(model_id, up4_c6):
+    key = (model_id, up4_c6)
+    fn = _SPECIALIZED_BATCHES.get(key)
+    if fn is None:
+        sim = _SIM_FNS[model_id]
+
+        @njit(parallel=True)
+        def fn(n_sims, target_count, init_state, base_seed, out_pulls, out_returns):
+            """并行执行全部模拟，各模拟完全独立，结果写入预分配数组"""
+            for i in prange(n_sims):
+                # 每次模拟独立种子化，避免线程间共享RNG状态
+                np.random.seed(base_seed + i)
+                # 初始状态是定长int32行，这里的copy就是一次memcpy（而非dict拷贝）
+                state = init_state.copy()
+                coll = np.zeros(COLL_SIZE, dtype=np.int32)
+                total_pulls, total_returns = 0, 0
+                for _ in range(target_count):
+                    pulls, returns = sim(state, coll, up4_c6)
+                    total_pulls += pulls
+                    total_returns += returns
+                out_pulls[i] = total_pulls
+                out_returns[i] = total_returns
+        _SPECIALIZED_BATCHES[key] = fn
+    return fn
+
 class MonteCarloModel:
     def __init__(self, args):
         self.args = args
         self.simulation_count = 50000 if args['pool'] == 'character' else 25000
     
     def run(self):
-        rng = self._RNG()
         model_key = f"{self.args['game']}-{self.args['pool']}"
-        model_logic = MODEL_LOGIC[model_key]
+        # 结果直接写入预分配的int32数组，不经过Python list再转换
+        pulls_array, returns_array = self._run_simulations(MODEL_IDS[model_key])
 
-        pulls_results, returns_results = [], []
-        
-        # 主模拟循环
-        for _ in range(self.simulation_count):
-            pulls, returns = self._simulate_one_full_run(rng, model_logic)
-            pulls_results.append(pulls)
-            # 只有角色池有详细的返还物计算
-            if self.args['pool'] == 'character':
-                returns_results.append(returns)
-        
-        pulls_array = np.array(pulls_results)
         pulls_data = self._calculate_percentiles(pulls_array)
         result = {"pulls": pulls_data}
-        
+
         # 如果提供了预算，计算成功率
         if self.args.get('budget') is not None:
             budget = self.args['budget']
-            success_count = np.sum(pulls_array <= budget)
+            # count_nonzero对bool数组是专门的快速归约，也顺手拿回Python int
+            success_count = int(np.count_nonzero(pulls_array <= budget))
             result['success_rate'] = (success_count / self.simulation_count) * 100
 
         # 如果计算了返还物，则加入结果
-        if returns_results:
-            result["returns"] = self._calculate_percentiles(np.array(returns_results), is_float=True)
-            
+        if returns_array is not None:
+            result["returns"] = self._calculate_percentiles(returns_array, is_float=True)
+
         return result
 
+    def _run_simulations(self, model_id):
+        """状态/收集品均为定长数组的批量模拟。numba存在时_run_batch被编译
+        并行执行，缺失时同一份代码以纯Python解释执行"""
+        init_state = _state_array_from_dict(self.args['initialState'])
+        up4_c6 = bool(self.args.get('up4C6', False))
+        target_count = self.args['targetCount']
+
+        base_seed = int(np.random.randint(0, 2**31 - self.simulation_count))
+        if CORE_AVAILABLE:
+            out_pulls, out_returns = _gacha_core.run_batch(
+                model_id, self.simulation_count, target_count,
+                init_state, up4_c6, base_seed)
+        else:
+            out_pulls = np.empty(self.simulation_count, dtype=np.int32)
+            out_returns = np.empty(self.simulation_count, dtype=np.int32)
+            _get_run_batch(model_id, up4_c6)(
+                self.simulation_count, target_count,
+                init_state, base_seed, out_pulls, out_returns)
+        # 只有角色池有详细的返还物计算；返还数组始终写入，非角色池直接丢弃
+        if self.args['pool'] == 'character':
+            return out_pulls, out_returns
+        return out_pulls, None
+
     def _calculate_percentiles(self, data, is_float=False):
         dtype = float if is_float else int
+        # 一次调用算全部分位数: 只做一次partition而不是五次
+        qs = np.percentile(data, [25, 50, 75, 90, 95])
         return {
             "mean": np.mean(data),
-            "p25": dtype(np.percentile(data, 25)),
-            "p50": dtype(np.percentile(data, 50)),
-            "p75": dtype(np.percentile(data, 75)),
-            "p90": dtype(np.percentile(data, 90)),
-            "p95": dtype(np.percentile(data, 95))
+            "p25": dtype(qs[0]),
+            "p50": dtype(qs[1]),
+            "p75": dtype(qs[2]),
+            "p90": dtype(qs[3]),
+            "p95": dtype(qs[4])
         }
 
-    def _simulate_one_full_run(self, rng, model_logic):
-        total_pulls, total_returns = 0, 0
-        # 复制初始状态，避免在多次模拟中被污染
-        state = self.args['initialState'].copy()
-        state['pity4'] = 0
-        state['isGuaranteed4'] = False
-        
-        # 'collection' 用于追踪获取到的角色/武器，以计算返还
-        collection = {'up_5_star': 0}
-
-        # 循环获取目标
-        for _ in range(self.args['targetCount']):
-            pulls, returns = model_logic.get_one_target_pulls_sim(state, rng, collection, self.args.get('up4C6', False))
-            total_pulls += pulls
-            total_returns += returns
-            
-        return total_pulls, total_returns
-
-    class _RNG:
-        """一个预生成随机数的快速RNG，避免在循环中频繁调用np.random"""
-        CHUNK_SIZE = 1_000_000
-        def __init__(self): self.chunk=np.random.rand(self.CHUNK_SIZE); self.index=0
-        def get(self):
-            if self.index >= self.CHUNK_SIZE: self.chunk=np.random.rand(self.CHUNK_SIZE); self.index=0
-            num=self.chunk[self.index]; self.index+=1; return num
-
 class MathematicalModel:
     def __init__(self, args):
         self.args = args
@@ -90,30 +554,103 @@ class MathematicalModel:
             initial_pulls = self.model_logic.get_expectation_for_state(self.args['initialState'])
             subsequent_pulls = self.model_logic.get_subsequent_expectation()
             mean = initial_pulls + (self.args['targetCount'] - 1) * subsequent_pulls
-        return {"mean": mean}
+        # 表降为float32后mean是np标量，转回Python float以便json序列化
+        return {"mean": float(mean)}
+
+# 期望/吸收概率表的磁盘缓存目录。脚本由sys.argv驱动、一次调用一个请求，
+# 缓存可以让后续进程完全跳过矩阵求解
+TABLE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'gacha')
 
 class GachaLogic:
+    # 决定转移结构（进而决定期望/吸收表）的方法。子类若一个都没覆盖，
+    # 它的表与定义这些方法的祖先类完全相同，可以共享
+    _TABLE_METHODS = ('_solve_expectations', '_get_prob_5_star', '_get_win_lose_prob')
+
     def __init__(self):
         # 延迟加载，只有在需要时才计算矩阵
         self.E_values = None
-    
+
+    def _table_owner(self):
+        """沿MRO找到真正定义建表方法的类。像GenshinWeaponLogic这类
+        纯文档子类与父类共用同一份表（同一缓存文件、同一内存数组）"""
+        for cls in type(self).__mro__:
+            if any(m in vars(cls) for m in self._TABLE_METHODS):
+                return cls
+        return type(self)
+
+    def _table_cache_path(self):
+        return os.path.join(TABLE_CACHE_DIR, f"{self._table_owner().__name__}_tables.npz")
+
+    def _load_cached_tables(self):
+        path = self._table_cache_path()
+        if os.path.exists(path):
+            try:
+                return np.load(path)
+            except Exception:
+                return None # 缓存损坏时静默重算
+        return None
+
+    def _save_cached_tables(self, **tables):
+        try:
+            os.makedirs(TABLE_CACHE_DIR, exist_ok=True)
+            np.savez(self._table_cache_path(), **tables)
+        except OSError:
+            pass # 写缓存失败不影响本次计算
+
     def _ensure_tables_calculated(self):
         if self.E_values is None:
-            A, b = self._build_transition_matrix()
-            self.E_values = np.linalg.solve(A, b)
-            
-    # 通用的状态更新逻辑
-    def _update_state_after_win(self, s, wg): s['pity'], s['isGuaranteed'] = 0, False
-    def _update_state_after_lose(self, s, wg): s['pity'], s['isGuaranteed'] = 0, True
+            # 同一owner类的单例间共享已求好的数组（挂在owner类上）
+            owner = self._table_owner()
+            shared = owner.__dict__.get('_shared_E_values')
+            if shared is not None:
+                self.E_values = shared
+                return
+            cached = self._load_cached_tables()
+            if cached is not None:
+                # 旧缓存可能是float64，读入时统一降为float32
+                self.E_values = np.asarray(cached['E_values'], dtype=np.float32)
+            else:
+                # 期望值量级不过几百抽，float32的~7位有效数字绰绰有余，
+                # 存储减半（求解仍在float64下进行，只降存储精度）
+                self.E_values = self._solve_expectations().astype(np.float32)
+                self._save_cached_tables(E_values=self.E_values)
+            owner._shared_E_values = self.E_values
+
+    def _p5_table(self):
+        """每档pity的出金概率表，回代求解的输入。
+        武器/光锥池的线性递增公式在硬保底前就会超过1，按概率语义截断到1.0
+        （与模拟路径rng < p5的实际行为一致）"""
+        return np.minimum(np.array([self._get_prob_5_star(p) for p in range(self.PITY_MAX)]), 1.0)
 
 class GenshinCharacterLogic(GachaLogic):
     PITY_MAX, GUARANTEE_MAX, MINGGUANG_MAX = 90, 2, 4
     TOTAL_STATES = PITY_MAX * GUARANTEE_MAX * MINGGUANG_MAX
     Absorption_Probs = None # 用于计算后续明光状态的概率
+    E_from_zero_mg = None   # (0,0,mg)各状态的期望向量
+    AP_from_zero = None     # (0,0,mg)各状态的吸收行拼成的mg转移矩阵
 
     def _ensure_tables_calculated(self):
-        if self.E_values is None: self.E_values = self._solve_expectations()
-        if self.Absorption_Probs is None: self.Absorption_Probs = self._solve_absorption_probabilities()
+        if self.E_values is None or self.Absorption_Probs is None:
+            owner = self._table_owner()
+            shared = owner.__dict__.get('_shared_tables')
+            if shared is not None:
+                self.E_values, self.Absorption_Probs = shared
+            else:
+                cached = self._load_cached_tables()
+                if cached is not None and 'Absorption_Probs' in cached:
+                    self.E_values = np.asarray(cached['E_values'], dtype=np.float32)
+                    self.Absorption_Probs = np.asarray(cached['Absorption_Probs'], dtype=np.float32)
+                else:
+                    self.E_values = self._solve_expectations().astype(np.float32)
+                    self.Absorption_Probs = self._solve_absorption_probabilities().astype(np.float32)
+                    self._save_cached_tables(E_values=self.E_values, Absorption_Probs=self.Absorption_Probs)
+                owner._shared_tables = (self.E_values, self.Absorption_Probs)
+        if self.AP_from_zero is None:
+            # 第2个及以后的目标都从(0,0,mg)出发，把这4个状态的期望/吸收行
+            # 抽出来，get_total_expectation就能用矩阵递推代替逐状态循环
+            zero_idx = [self._state_to_index((0, 0, mg)) for mg in range(self.MINGGUANG_MAX)]
+            self.E_from_zero_mg = self.E_values[zero_idx]
+            self.AP_from_zero = self.Absorption_Probs[zero_idx]
 
     def _state_to_index(self, s): return s[0] + s[1]*self.PITY_MAX + s[2]*self.PITY_MAX*self.GUARANTEE_MAX
     def _get_prob_5_star(self, p): pull=p+1; return 1. if pull>=90 else (0.006 if pull<74 else 0.006+(pull-73)*0.06)
@@ -122,125 +659,32 @@ class GenshinCharacterLogic(GachaLogic):
         p_mg=0.00018; p_win=p_mg+(1-p_mg)*0.5; p_lose=(1-p_mg)*0.5
         return p_win, p_lose
 
+    def _p_lose_by_mg(self):
+        # 星铁子类覆盖了_get_win_lose_prob（无明光机制），所以按mg逐档取值
+        return np.array([self._get_win_lose_prob(False, mg)[1] for mg in range(self.MINGGUANG_MAX)])
+
     def _solve_expectations(self):
-        A=np.identity(self.TOTAL_STATES); b=np.ones(self.TOTAL_STATES)
-        for i in range(self.TOTAL_STATES):
-            mg,is_g,p=i//(self.PITY_MAX*self.GUARANTEE_MAX),(i%(self.PITY_MAX*self.GUARANTEE_MAX))//self.PITY_MAX,i%self.PITY_MAX
-            p5=self._get_prob_5_star(p)
-            if p5<1.0: A[i,self._state_to_index((p+1,is_g,mg))]-=(1-p5)
-            if p5>0:
-                _,p_lose=self._get_win_lose_prob(is_g,mg)
-                if p_lose>0:
-                    new_mg=mg+1 if not is_g else mg
-                    A[i,self._state_to_index((0,1,min(new_mg,self.MINGGUANG_MAX-1)))]-=p5*p_lose
-        return np.linalg.solve(A,b)
+        return _backsolve_mg_chain(self._p5_table(), self._p_lose_by_mg())
 
     def _solve_absorption_probabilities(self):
-        Q=np.zeros((self.TOTAL_STATES,self.TOTAL_STATES)); R=np.zeros((self.TOTAL_STATES,self.MINGGUANG_MAX))
-        for i in range(self.TOTAL_STATES):
-            mg,is_g,p=i//(self.PITY_MAX*self.GUARANTEE_MAX),(i%(self.PITY_MAX*self.GUARANTEE_MAX))//self.PITY_MAX,i%self.PITY_MAX
-            p5=self._get_prob_5_star(p)
-            if p5<1.0: Q[i,self._state_to_index((p+1,is_g,mg))]=(1-p5)
-            if p5>0:
-                p_win,p_lose=self._get_win_lose_prob(is_g,mg)
-                if p_lose>0:
-                    new_mg=mg+1 if not is_g else mg
-                    Q[i,self._state_to_index((0,1,min(new_mg,self.MINGGUANG_MAX-1)))]=p5*p_lose
-                if p_win>0:
-                    final_mg=0 if not is_g else mg
-                    R[i,final_mg]=p5*p_win
-        N=np.linalg.inv(np.identity(self.TOTAL_STATES)-Q); B=np.dot(N,R)
-        return B
+        return _backsolve_mg_absorption(self._p5_table(), self._p_lose_by_mg())
 
     def get_total_expectation(self, args):
         self._ensure_tables_calculated()
-        initial_state=args['initialState']; target_count=args['targetCount']; total_pulls=0.0
+        initial_state=args['initialState']; target_count=args['targetCount']
         start_state_index=self._state_to_index((initial_state['pity'],1 if initial_state['isGuaranteed']else 0,initial_state['mingguangCounter']))
-        pulls_for_first=self.E_values[start_state_index]
-        total_pulls+=pulls_for_first
+        total_pulls=self.E_values[start_state_index]
         if target_count > 1:
-            current_mg_dist=self.Absorption_Probs[start_state_index]
-            for i in range(2,target_count+1):
-                pulls_for_this_target=0; next_mg_dist=np.zeros(self.MINGGUANG_MAX)
-                for mg,prob in enumerate(current_mg_dist):
-                    if prob>1e-9:
-                        state_idx=self._state_to_index((0,0,mg)); exp_from_this_mg=self.E_values[state_idx]
-                        pulls_for_this_target+=prob*exp_from_this_mg
-                        next_mg_dist+=prob*self.Absorption_Probs[state_idx]
-                total_pulls+=pulls_for_this_target; current_mg_dist=next_mg_dist
+            # 后续每个目标的期望是当前mg分布与E_from_zero_mg的点积，
+            # 分布本身按4x4吸收矩阵递推
+            mg_dist=self.Absorption_Probs[start_state_index]
+            for _ in range(target_count-1):
+                total_pulls+=mg_dist @ self.E_from_zero_mg
+                mg_dist=mg_dist @ self.AP_from_zero
         return total_pulls
 
-    def get_one_target_pulls_sim(self,state,rng,collection,up4_c6):
-        pulls,returns_this_run=0,0
-        while True:
-            pulls+=1; state['pity']+=1; state['pity4']+=1; p5=self._get_prob_5_star(state['pity']-1)
-            if rng.get()<p5:
-                was_guaranteed=state['isGuaranteed']; p_win,_=self._get_win_lose_prob(was_guaranteed,state.get('mingguangCounter',0))
-                is_target=rng.get()<p_win; state['pity'],state['pity4']=0,0
-                if is_target:
-                    returns_this_run+=self._get_5_star_return(True,collection,rng); self._update_state_after_win(state,was_guaranteed); return pulls,returns_this_run
-                else:
-                    returns_this_run+=self._get_5_star_return(False,collection,rng); self._update_state_after_lose(state,was_guaranteed)
-            elif state['pity4']>=10 or rng.get()<0.051/(1-p5 if p5<1 else 0.99): returns_this_run+=self._handle_4_star_pull(state,rng,collection,up4_c6)
-    
-    def _get_5_star_return(self, is_up, c, rng):
-        NUM_STANDARD_5_STARS = 7
-        if is_up:
-            c['up_5_star'] = c.get('up_5_star', 0) + 1
-            return 10 if c['up_5_star'] <= 7 else 25
-        else:
-            char_index = int(rng.get() * NUM_STANDARD_5_STARS)
-            char_key = f"std_5_star_{char_index}"
-            c[char_key] = c.get(char_key, 0) + 1
-            if c[char_key] == 1: return 0
-            elif c[char_key] <= 7: return 10
-            else: return 25
-
-    # This logic is already correct for Genshin's 4-star pool
-    def _handle_4_star_pull(self,s,r,c,u):
-        s['pity4']=0; NUM_CHARS, NUM_WEAPONS = 39, 18
-        TOTAL_OFF_BANNER = NUM_CHARS + NUM_WEAPONS
-        if s['isGuaranteed4'] or r.get()<0.5: s['isGuaranteed4']=False; return 5 if u else 2
-        else:
-            s['isGuaranteed4']=True
-            if r.get() < NUM_CHARS / TOTAL_OFF_BANNER: # It's a character
-                i=f"std_char_{int(r.get()*NUM_CHARS)}"; c[i]=c.get(i,0)+1; return 0 if c[i]==1 else (2 if c[i]<=7 else 5)
-            else: # It's a weapon
-                return 2
-    
-    def _update_state_after_win(self,state,was_guaranteed):
-        super()._update_state_after_win(state,was_guaranteed)
-        if not was_guaranteed: state['mingguangCounter']=0
-        
-    def _update_state_after_lose(self,state,was_guaranteed):
-        super()._update_state_after_lose(state,was_guaranteed)
-        if not was_guaranteed: state['mingguangCounter'] = state.get('mingguangCounter', 0) + 1
-
 class HSRCharacterLogic(GenshinCharacterLogic):
-    """Inherits from Genshin logic for simulation structure, but overrides return calculations."""
-    def _get_5_star_return(self, is_up, c, rng):
-        # Simply call the parent (Genshin) logic and multiply by 4
-        genshin_returns = super()._get_5_star_return(is_up, c, rng)
-        return genshin_returns * 4
-
-    def _handle_4_star_pull(self, s, r, c, u):
-        s['pity4'] = 0
-        NUM_CHARS, NUM_LCS = 22, 29
-        TOTAL_OFF_BANNER = NUM_CHARS + NUM_LCS
-        
-        if s.get('isGuaranteed4', False) or r.get() < 0.5:
-            s['isGuaranteed4'] = False
-            return 20 if u else 8  # 5*4 or 2*4
-        else:
-            s['isGuaranteed4'] = True
-            if r.get() < NUM_CHARS / TOTAL_OFF_BANNER: # It's a character
-                i = f"std_char_{int(r.get() * NUM_CHARS)}"
-                c[i] = c.get(i, 0) + 1
-                if c[i] == 1: return 0
-                elif c[i] <= 7: return 8
-                else: return 20
-            else: # It's a light cone
-                return 8
+    """Inherits the Genshin Markov-chain structure but overrides win/lose odds."""
     def _get_win_lose_prob(self, is_g, mg=0):
     # 覆盖父类的方法，移除明光机制，使用纯粹的56.25/43.75概率
     # mg参数保留以兼容方法签名，但在此处无实际作用
@@ -257,31 +701,6 @@ class SimpleGachaModel(GachaLogic):
         self._ensure_tables_calculated()
         return self.E_values[self._state_to_index(self.zero_state)]
 
-    def get_one_target_pulls_sim(self, state, rng, collection, up4_c6):
-        pulls, returns_this_run = 0, 0
-        while True:
-            pulls += 1
-            state['pity'] += 1
-            state['pity4'] += 1
-            p5 = self._get_prob_5_star(state['pity'] - 1)
-            if rng.get() < p5:
-                was_guaranteed = state['isGuaranteed'] or state.get('fatePoint', 0) >= 2
-                p_win, _ = self._get_win_lose_prob(was_guaranteed)
-                is_target = rng.get() < p_win
-                state['pity'], state['pity4'] = 0, 0
-                if is_target:
-                    returns_this_run += self._get_5_star_return(True, collection, rng)
-                    self._update_state_after_win(state, was_guaranteed)
-                    return pulls, returns_this_run
-                else:
-                    returns_this_run += self._get_5_star_return(False, collection, rng)
-                    self._update_state_after_lose(state, was_guaranteed)
-            elif state['pity4'] >= 10 or rng.get() < (0.051 / (1 - p5 if p5 < 1 else 0.99)):
-                returns_this_run += self._handle_4_star_pull(state, rng, collection, up4_c6)
-    
-    def _get_5_star_return(self, is_up, c, rng): return 10
-    def _handle_4_star_pull(self, s, r, c, u): s['pity4'] = 0; return 2
-
 class GenshinWeaponModel(SimpleGachaModel):
     PITY_MAX, FATE_MAX, GUARANTEE_MAX = 80, 3, 2 # 新增 GUARANTEE_MAX
     TOTAL_STATES = PITY_MAX * FATE_MAX * GUARANTEE_MAX # <--- 修正计算方式
@@ -292,77 +711,12 @@ class GenshinWeaponModel(SimpleGachaModel):
     def _get_prob_5_star(self, p):
         pull = p + 1; return 1. if pull >= 80 else (0.007 if pull < 64 else 0.007 + (pull - 63) * 0.07)
     def _get_win_lose_prob(self, is_g_or_fate_full): return (1.0, 0.0) if is_g_or_fate_full else (0.375, 0.625)
-    def _build_transition_matrix(self):
-        A, b = np.identity(self.TOTAL_STATES), np.ones(self.TOTAL_STATES)
-        for i in range(self.TOTAL_STATES):
-            guaranteed, fate, pity = i // (self.PITY_MAX * self.FATE_MAX), (i % (self.PITY_MAX * self.FATE_MAX)) // self.PITY_MAX, i % self.PITY_MAX
-            p5 = self._get_prob_5_star(pity)
-            is_g_or_fate_full = guaranteed or fate >= 2
-            if p5 < 1.0: A[i, self._state_to_index((pity + 1, fate, guaranteed))] -= (1.0 - p5)
-            if p5 > 0:
-                p_win, p_lose = self._get_win_lose_prob(is_g_or_fate_full)
-                if p_lose > 0: A[i, self._state_to_index((0, min(fate + 1, self.FATE_MAX - 1), True))] -= p5 * p_lose
-        return A, b
-    def _update_state_after_win(self, s, wg): s['pity'], s['fatePoint'], s['isGuaranteed'] = 0, 0, False
-    def _update_state_after_lose(self, s, wg): s['pity'], s['fatePoint'], s['isGuaranteed'] = 0, min(s.get('fatePoint',0) + 1, self.FATE_MAX - 1), True
+    def _solve_expectations(self):
+        _, p_lose = self._get_win_lose_prob(False)
+        return _backsolve_fate_chain(self._p5_table(), p_lose, self.FATE_MAX)
 
 class GenshinWeaponLogic(GenshinWeaponModel):
-    """
-    为原神武器池计算返还星辉
-    """
-    def get_one_target_pulls_sim(self, state, rng, collection, up4_c6):
-        pulls, returns_this_run = 0, 0
-        while True:
-            pulls += 1
-            state['pity'] += 1
-            state['pity4'] += 1
-            p5 = self._get_prob_5_star(state['pity'] - 1)
-            
-            # 抽中5星
-            if rng.get() < p5:
-                was_guaranteed = state['isGuaranteed'] or state.get('fatePoint', 0) >= 2
-                p_win, _ = self._get_win_lose_prob(was_guaranteed)
-                is_target = rng.get() < p_win
-                state['pity'], state['pity4'] = 0, 0
-                
-                returns_this_run += self._get_5_star_return(is_target, collection, rng)
-                if is_target:
-                    self._update_state_after_win(state, was_guaranteed)
-                    return pulls, returns_this_run
-                else:
-                    self._update_state_after_lose(state, was_guaranteed)
-            
-            # 抽中4星 (基于10连保底或基础概率)
-            elif state['pity4'] >= 10 or rng.get() < (0.051 / (1 - p5 if p5 < 1 else 0.99)):
-                 returns_this_run += self._handle_4_star_pull(state, rng, collection, up4_c6)
-
-    def _get_5_star_return(self, is_up, c, rng):
-        # 武器池5星只返还10星辉
-        return 10
-
-    def _handle_4_star_pull(self, s, r, c, u):
-        s['pity4'] = 0
-        
-        # 武器池的4星UP概率为75%
-        if s.get('isGuaranteed4', False) or r.get() < 0.75:
-            s['isGuaranteed4'] = False
-            # 获得UP四星武器，返还2星辉
-            return 2
-        else:
-            s['isGuaranteed4'] = True
-            # 歪了，此时可能获得常驻武器或常驻角色
-            # 此处假设角色和武器概率均等 (50/50)
-            NUM_CHARS, NUM_WEAPONS = 39, 18 # 引用原神角色池的常驻数量
-            TOTAL_OFF_BANNER = NUM_CHARS + NUM_WEAPONS
-
-            if r.get() < NUM_CHARS / TOTAL_OFF_BANNER: # 模拟抽到了角色
-                i = f"std_char_{int(r.get() * NUM_CHARS)}"
-                c[i] = c.get(i, 0) + 1
-                if c[i] == 1: return 0      # New: 0 星辉
-                elif c[i] <= 7: return 2  # 1-6命: 2 星辉
-                else: return 5              # 满命后: 5 星辉
-            else: # 模拟抽到了武器
-                return 2
+    """原神武器池。返还星辉的模拟逻辑见_sim_genshin_weapon"""
 
 class HSRCharacterModel(SimpleGachaModel):
     PITY_MAX, GUARANTEE_MAX = 90, 2
@@ -374,48 +728,9 @@ class HSRCharacterModel(SimpleGachaModel):
     def _get_prob_5_star(self, p):
         pull = p + 1; return 1. if pull >= 90 else (0.006 if pull < 74 else 0.006 + (pull - 73) * 0.06)
     def _get_win_lose_prob(self, is_g): return (1.0, 0.0) if is_g else (0.5, 0.5) # HSR is 50/50
-    def _build_transition_matrix(self):
-        A, b = np.identity(self.TOTAL_STATES), np.ones(self.TOTAL_STATES)
-        for i in range(self.TOTAL_STATES):
-            is_g, pity = i // self.PITY_MAX, i % self.PITY_MAX
-            p5 = self._get_prob_5_star(pity)
-            if p5 < 1.0: A[i, self._state_to_index((pity + 1, is_g))] -= (1.0 - p5)
-            if p5 > 0:
-                _, p_lose = self._get_win_lose_prob(is_g)
-                if p_lose > 0: A[i, self._state_to_index((0, 1))] -= p5 * p_lose
-        return A, b
-    
-    def _get_5_star_return(self, is_up, c, rng):
-        NUM_STANDARD_5_STARS = 7
-        if is_up:
-            c['up_5_star'] = c.get('up_5_star', 0) + 1
-            return 40 if c['up_5_star'] <= 7 else 100
-        else:
-            char_index = int(rng.get() * NUM_STANDARD_5_STARS)
-            char_key = f"std_5_star_{char_index}"
-            c[char_key] = c.get(char_key, 0) + 1
-            if c[char_key] == 1: return 0
-            elif c[char_key] <= 7: return 40
-            else: return 100
-            
-    def _handle_4_star_pull(self, s, r, c, u):
-        s['pity4'] = 0
-        NUM_CHARS, NUM_LCS = 22, 29
-        TOTAL_OFF_BANNER = NUM_CHARS + NUM_LCS
-        if s.get('isGuaranteed4', False) or r.get() < 0.5:
-            s['isGuaranteed4'] = False
-            return 20 if u else 8
-        else:
-            s['isGuaranteed4'] = True
-            if r.get() < NUM_CHARS / TOTAL_OFF_BANNER:
-                char_index = int(r.get() * NUM_CHARS)
-                char_key = f"std_char_{char_index}"
-                c[char_key] = c.get(char_key, 0) + 1
-                if c[char_key] == 1: return 0
-                elif c[char_key] <= 7: return 8
-                else: return 20
-            else:
-                return 8
+    def _solve_expectations(self):
+        _, p_lose = self._get_win_lose_prob(False)
+        return _backsolve_simple_chain(self._p5_table(), p_lose)
 
 class HSRLightConeModel(SimpleGachaModel):
     PITY_MAX, GUARANTEE_MAX = 80, 2
@@ -427,136 +742,15 @@ class HSRLightConeModel(SimpleGachaModel):
     def _get_prob_5_star(self, p):
         pull = p + 1; return 1. if pull >= 80 else (0.008 if pull < 66 else 0.008 + (pull - 65) * 0.08)
     def _get_win_lose_prob(self, is_g): return (1.0, 0.0) if is_g else (0.75, 0.25)
-    def _build_transition_matrix(self):
-        A, b = np.identity(self.TOTAL_STATES), np.ones(self.TOTAL_STATES)
-        for i in range(self.TOTAL_STATES):
-            is_g, pity = i // self.PITY_MAX, i % self.PITY_MAX
-            p5 = self._get_prob_5_star(pity)
-            if p5 < 1.0: A[i, self._state_to_index((pity + 1, is_g))] -= (1.0 - p5)
-            if p5 > 0:
-                _, p_lose = self._get_win_lose_prob(is_g)
-                if p_lose > 0: A[i, self._state_to_index((0, 1))] -= p5 * p_lose
-        return A, b
-    
-    def _get_5_star_return(self, is_up, c, rng): return 40
-    def _handle_4_star_pull(self, s, r, c, u): s['pity4'] = 0; return 8
+    def _solve_expectations(self):
+        _, p_lose = self._get_win_lose_prob(False)
+        return _backsolve_simple_chain(self._p5_table(), p_lose)
 
 class HSRLightConeLogic(HSRLightConeModel):
-    """
-    为星铁光锥池提供精细化模拟，以计算返还星芒。
-    """
-    def get_one_target_pulls_sim(self, state, rng, collection, up4_c6):
-        pulls, returns_this_run = 0, 0
-        while True:
-            pulls += 1
-            state['pity'] += 1
-            state['pity4'] += 1
-            p5 = self._get_prob_5_star(state['pity'] - 1)
-            
-            if rng.get() < p5:
-                was_guaranteed = state['isGuaranteed']
-                p_win, _ = self._get_win_lose_prob(was_guaranteed)
-                is_target = rng.get() < p_win
-                state['pity'], state['pity4'] = 0, 0
-                
-                returns_this_run += self._get_5_star_return(is_target, collection, rng)
-                if is_target:
-                    self._update_state_after_win(state, was_guaranteed)
-                    return pulls, returns_this_run
-                else:
-                    self._update_state_after_lose(state, was_guaranteed)
-            
-            elif state['pity4'] >= 10 or rng.get() < (0.066 / (1 - p5 if p5 < 1 else 0.99)):
-                 returns_this_run += self._handle_4_star_pull(state, rng, collection, up4_c6)
-    
-    def _get_5_star_return(self, is_up, c, rng):
-        # 光锥池5星只返还40星芒
-        return 40
-
-    def _handle_4_star_pull(self, s, r, c, u):
-        s['pity4'] = 0
-        
-        if s.get('isGuaranteed4', False) or r.get() < 0.75:
-            s['isGuaranteed4'] = False
-            return 8 # UP四星光锥返还8星芒
-        else:
-            s['isGuaranteed4'] = True
-            # 歪了，可能获得常驻光锥或常驻角色
-            # 假设角色和光锥概率均等
-            NUM_CHARS, NUM_LCS = 22, 29 # 引用星铁角色池的常驻数量
-            TOTAL_OFF_BANNER = NUM_CHARS + NUM_LCS
-
-            if r.get() < NUM_CHARS / TOTAL_OFF_BANNER: # 模拟抽到了角色
-                i = f"std_char_{int(r.get() * NUM_CHARS)}"
-                c[i] = c.get(i, 0) + 1
-                if c[i] == 1: return 0 # New: 0 星芒
-                elif c[i] <= 7: return 8 # 1-6魂: 8 星芒
-                else: return 20 # 满魂后: 20 星芒
-            else: # 模拟抽到了光锥
-                return 8
+    """星铁光锥池。返还星芒的模拟逻辑见_sim_hsr_lightcone"""
 
 class ZZZCharacterLogic(HSRCharacterModel):
-    def get_one_target_pulls_sim(self, state, rng, collection, up4_c6):
-        pulls, returns_this_run = 0, 0
-        while True:
-            pulls += 1
-            state['pity'] += 1
-            state['pity4'] += 1
-            p5 = self._get_prob_5_star(state['pity'] - 1) 
-            
-            if rng.get() < p5:
-                was_guaranteed = state['isGuaranteed']
-                p_win, _ = self._get_win_lose_prob(was_guaranteed) 
-                is_target = rng.get() < p_win
-                state['pity'], state['pity4'] = 0, 0
-                
-                returns_this_run += self._get_5_star_return(is_target, collection, rng)
-                if is_target:
-                    self._update_state_after_win(state, was_guaranteed)
-                    return pulls, returns_this_run
-                else:
-                    self._update_state_after_lose(state, was_guaranteed)
-
-            elif state['pity4'] >= 10 or rng.get() < (0.094 / (1 - p5 if p5 < 1 else 0.99)):
-                 returns_this_run += self._handle_4_star_pull(state, rng, collection, up4_c6)
-    
-    def _get_5_star_return(self, is_up, c, rng):
-        NUM_STANDARD_5_STARS = 6
-        agent_key = ""
-        if is_up:
-            agent_key = 'up_5_star'
-        else:
-            agent_index = int(rng.get() * NUM_STANDARD_5_STARS)
-            agent_key = f"std_5_star_{agent_index}"
-
-        c[agent_key] = c.get(agent_key, 0) + 1
-        
-        if c[agent_key] == 1: return 0
-        elif c[agent_key] <= 7: return 40
-        else: return 100
-        
-    def _handle_4_star_pull(self, s, r, c, u):
-        s['pity4'] = 0
-        
-        # 50% 概率获得 UP A级
-        if s.get('isGuaranteed4', False) or r.get() < 0.5:
-            s['isGuaranteed4'] = False
-            return 20 if u else 8
-        else:
-            # 歪了，获得常驻 A级代理人 或 A级音擎
-            s['isGuaranteed4'] = True
-            PROB_AGENT = 7.05 / (7.05 + 2.35)
-            NUM_STANDARD_A_AGENTS = 12
-
-            if r.get() < PROB_AGENT: # 获得常驻A级代理人
-                # 动态追踪每个常驻角色的获取次数
-                i = f"std_char_{int(r.get() * NUM_STANDARD_A_AGENTS)}"
-                c[i] = c.get(i, 0) + 1
-                if c[i] == 1: return 0
-                elif c[i] <= 7: return 8
-                else: return 20
-            else: # 获得A级音擎
-                return 8
+    """绝区零角色池。概率结构与星铁角色池相同，模拟逻辑见_sim_zzz_char"""
 
 class ZZZWeaponLogic(HSRLightConeModel):
 
@@ -570,54 +764,6 @@ class ZZZWeaponLogic(HSRLightConeModel):
     def _get_win_lose_prob(self, is_g):
         return (1.0, 0.0) if is_g else (0.75, 0.25)
 
-    def get_one_target_pulls_sim(self, state, rng, collection, up4_c6):
-        pulls, returns_this_run = 0, 0
-        while True:
-            pulls += 1
-            state['pity'] += 1
-            state['pity4'] += 1
-            p5 = self._get_prob_5_star(state['pity'] - 1)
-            
-            if rng.get() < p5:
-                was_guaranteed = state['isGuaranteed']
-                p_win, _ = self._get_win_lose_prob(was_guaranteed)
-                is_target = rng.get() < p_win
-                state['pity'], state['pity4'] = 0, 0
-                
-                returns_this_run += 40
-                if is_target:
-                    self._update_state_after_win(state, was_guaranteed)
-                    return pulls, returns_this_run
-                else:
-                    self._update_state_after_lose(state, was_guaranteed)
-            
-            elif state['pity4'] >= 10 or rng.get() < (0.15 / (1 - p5 if p5 < 1 else 0.99)):
-                 returns_this_run += self._handle_4_star_pull(state, rng, collection, up4_c6)
-    
-    def _get_5_star_return(self, is_up, c, rng):
-        return 40
-
-    def _handle_4_star_pull(self, s, r, c, u):
-        s['pity4'] = 0
-        
-        if s.get('isGuaranteed4', False) or r.get() < 0.75:
-            s['isGuaranteed4'] = False
-            return 8
-        else:
-            s['isGuaranteed4'] = True
-            PROB_WEAPON = 13.125 / (13.125 + 1.875)
-            # 常驻A级代理人共12名
-            NUM_STANDARD_A_AGENTS = 12 
-
-            if r.get() < PROB_WEAPON: # 歪出常驻A级音擎
-                return 8
-            else: # 歪出常驻A级代理人
-                i = f"std_char_{int(r.get() * NUM_STANDARD_A_AGENTS)}"
-                c[i] = c.get(i, 0) + 1
-                if c[i] == 1: return 0
-                elif c[i] <= 7: return 8
-                else: return 20
-
 MODEL_LOGIC = {
     "genshin-character": GenshinCharacterLogic(),
     "genshin-weapon": GenshinWeaponLogic(),